@@ -1,22 +1,28 @@
+import os
 import asyncio
 import aiofiles
 import json
+import subprocess
 from utils import log
 from models import Model
+from tools import ToolRegistry, default_tools
 from configs import ( 
     CoT_PROMPT, 
     CHAT_PROMPT, 
     ROUTER_PROMPT, 
     DEFAULT_PROMPT, 
     CHAOS_PROMPT, 
-    STREAM_DISABLED 
+    STREAM_DISABLED,
+    MAX_TOOL_ITERATIONS
 )
 
 class AI:
-    def __init__(self, model_config_path="main/Models_config.json", context_path="main/saves/context.json"):
+    def __init__(self, model_config_path="main/Models_config.json", context_path="main/saves/context.json", tools: ToolRegistry = default_tools):
         self.model_config_path = model_config_path
         self.context_path = context_path
         self.models: dict[str, Model] = {}
+        self.tools = tools
+        self.config_watcher: asyncio.Task | None = None
         self.system_prompts = {
             "chat": CHAT_PROMPT,
             "router": ROUTER_PROMPT,
@@ -25,16 +31,26 @@ class AI:
         self.default_model = 'chat'
         self.load_models()
 
+    def read_model_configs(self) -> dict[str, dict]:
+        with open(self.model_config_path, 'r', encoding="utf-8") as f:
+            models_data = json.load(f)
+        if not isinstance(models_data, list) or not all(isinstance(m, dict) for m in models_data):
+            raise ValueError("Models config must be a list of model objects.")
+        configs = {}
+        for model_data in models_data:
+            role = model_data.get('role')
+            if role:
+                model_data["system_prompt"] = self.system_prompts.get(role, DEFAULT_PROMPT)
+                configs[role] = model_data
+        return configs
+
     def load_models(self):
         try:
-            with open(self.model_config_path, 'r', encoding="utf-8") as f:
-                models_data = json.load(f)
-                for model_data in models_data:
-                    role = model_data.get('role')
-                    if role:
-                        model_data["system_prompt"] = self.system_prompts.get(role, DEFAULT_PROMPT)
-                        self.models[role] = Model(**model_data)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            self.config_mtime = os.path.getmtime(self.model_config_path)
+            self.model_configs = self.read_model_configs()
+            for role, model_data in self.model_configs.items():
+                self.models[role] = Model(**model_data)
+        except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
             print(f"🟥 Error loading models: {e}")
             exit(1)
 
@@ -45,6 +61,7 @@ class AI:
         for model in self.models.values():
             await model.warm_up()
             await asyncio.sleep(0.02) 
+        self.config_watcher = asyncio.create_task(self.watch_config())
 
     async def load_context(self):
         try:
@@ -63,12 +80,134 @@ class AI:
 
     async def check_models(self, interval=10):
         while True:
-            for role, model in self.models.items():
+            # Snapshot: hot reloads may swap entries while we await
+            for role, model in list(self.models.items()):
                 if model.process and model.process.poll() is not None:
                     await log(f"⚠️ {model.name} crashed. Restarting...", "warn")
                     await model.warm_up()
             await asyncio.sleep(interval)
 
+    async def watch_config(self, interval=2):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                mtime = os.path.getmtime(self.model_config_path)
+            except FileNotFoundError:
+                continue
+            if mtime != self.config_mtime:
+                self.config_mtime = mtime
+                try:
+                    await self.reload_models()
+                except Exception as e:
+                    # Keep watching: one bad edit shouldn't disable hot reload for the rest of the run
+                    await log(f"🟥 Hot reload failed: {e}", "error")
+
+    async def reload_models(self):
+        """Diffs Models_config.json against the running models and swaps only the roles that changed."""
+        try:
+            new_configs = self.read_model_configs()
+        except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
+            await log(f"🟥 Error reloading models, keeping current ones: {e}", "error")
+            return
+
+        changed = [role for role, cfg in new_configs.items() if cfg != self.model_configs.get(role)]
+        removed = [role for role in self.model_configs if role not in new_configs]
+        if not changed and not removed:
+            return
+
+        # Validate the whole config before starting or stopping anything
+        if self.default_model in removed:
+            await log(f"🟥 Default model '{self.default_model}' can't be removed. Keeping current models.", "error")
+            return
+        ports: dict[int, str] = {}
+        for role, cfg in new_configs.items():
+            port = cfg.get("port")
+            if port in ports:
+                await log(f"🟥 '{role}' and '{ports[port]}' both use port {port}. Keeping current models.", "error")
+                return
+            ports[port] = role
+        for role in changed:
+            port = new_configs[role].get("port")
+            holder = next((r for r, m in self.models.items() if r != role and m.port == port), None)
+            if holder is not None and holder not in removed:
+                await log(f"🟥 Port {port} for '{role}' is still held by '{holder}'. Move '{holder}' off it in a separate edit first.", "error")
+                return
+        new_models: dict[str, Model] = {}
+        for role in changed:
+            try:
+                new_models[role] = Model(**new_configs[role])
+            except TypeError as e:
+                await log(f"🟥 Invalid config for '{role}': {e}. Keeping current models.", "error")
+                return
+
+        await log(f"Models config changed. Swapping: {changed or 'none'}, removing: {removed or 'none'}", "info")
+
+        # Removed roles whose port is being reused have to be gone before the new server binds it
+        freeing = [role for role in removed if self.models[role].port in ports]
+        results = await asyncio.gather(*(self.remove_model(role) for role in freeing), return_exceptions=True)
+        results += await asyncio.gather(
+            *(self.swap_model(role, new_models[role], new_configs[role]) for role in changed),
+            *(self.remove_model(role) for role in removed if role not in freeing),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                await log(f"🟥 Hot reload step failed: {result}", "error")
+
+    async def swap_model(self, role: str, new: Model, model_data: dict):
+        old = self.models.get(role)
+        # Same port means the same `ollama serve`, which can serve any model: reuse it instead of restarting
+        reuse_server = old is not None and old.port == new.port
+        try:
+            if reuse_server:
+                await new.check_generation()
+            else:
+                await new.warm_up()
+        except TimeoutError as e:
+            await log(f"{e}", "error")
+        except asyncio.CancelledError:
+            # Shutdown mid-swap: `new` isn't in self.models yet, so nobody else would stop it
+            await self.stop_model(new)
+            raise
+
+        if not new.warmed_up:
+            await log(f"🟥 New '{role}' model failed to warm up. Keeping the old one.", "error")
+            await self.stop_model(new)
+            return
+
+        if reuse_server:
+            new.process, old.process = old.process, None
+        # Single assignment: new requests get the new model, in-flight ones keep their reference to the old one
+        self.models[role] = new
+        self.model_configs[role] = model_data
+        await log(f"🟩 '{role}' now served by {new.name} ({new.ollama_name}).", "success")
+
+        if old is not None:
+            await self.retire_model(old)
+
+    async def remove_model(self, role: str):
+        old = self.models.pop(role)
+        del self.model_configs[role]
+        await self.retire_model(old)
+
+    async def retire_model(self, model: Model):
+        """Waits for in-flight requests on a model that no longer receives traffic, then stops it."""
+        try:
+            await model.drain()
+        finally:
+            await self.stop_model(model)
+
+    async def stop_model(self, model: Model, timeout: int = 10):
+        await model.shutdown()
+        if model.process is None:
+            return
+        # Wait for the port to be released before anything else binds it
+        try:
+            await asyncio.to_thread(model.process.wait, timeout)
+        except subprocess.TimeoutExpired:
+            await log(f"⚠️ {model.name} ignored SIGTERM for {timeout}s. Killing it.", "warn")
+            model.process.kill()
+            await asyncio.to_thread(model.process.wait)
 
     async def route_query(self, query: str):
         router_model = self.models.get("router")
@@ -85,8 +224,72 @@ class AI:
             await log(f"⚠️ Router selected unknown role '{selected_role}'. Using default '{self.default_model}'.", "warn")
             return self.default_model
 
+    async def run_agent(self, role: str, query: str):
+        """Model -> tools -> model loop. Tool calls of one turn run concurrently, so each round costs the slowest tool, not the sum."""
+        # The role may have been removed by a hot reload since routing
+        model = self.models.get(role) or self.models[self.default_model]
+        # Held for the whole loop so a hot reload doesn't shut the model down between tool rounds
+        model.in_flight += 1
+        try:
+            async for part in self._run_agent(model, query):
+                yield part
+        finally:
+            model.in_flight -= 1
+
+    async def _run_agent(self, model: Model, query: str):
+        messages = (
+            [{"role": "system", "content": model.system}]
+            + self.context.get("conversations", [])
+            + [{"role": "user", "content": query}]
+        )
+        tools = self.tools.schemas() if model.has_tools else None
+
+        for i in range(MAX_TOOL_ITERATIONS + 1):
+            # Last round goes out without tools so the model has to answer
+            if i == MAX_TOOL_ITERATIONS and tools:
+                await log(f"⚠️ {model.name} hit the tool iteration cap ({MAX_TOOL_ITERATIONS}). Forcing a final answer.", "warn")
+                tools = None
+
+            content = ""
+            tool_calls = []
+            async for part in model.generate_tool_step(messages, tools):
+                if "tool_calls" in part:
+                    tool_calls = part["tool_calls"]
+                else:
+                    content += part["content"]
+                    yield part["content"]
+
+            if not tool_calls:
+                return
+            if tools is None:
+                # Tools were withheld (cap reached or model has none); running them now would discard the results
+                await log(f"⚠️ {model.name} requested tools without any offered. Ignoring {len(tool_calls)} call(s).", "warn")
+                return
+
+            messages.append({"role": "assistant", "content": content, "tool_calls": tool_calls})
+            messages.extend(await self.tools.run_calls(tool_calls))
+
+    async def generate(self, query: str):
+        role = await self.route_query(query)
+        response = ""
+        async for part in self.run_agent(role, query):
+            response += part
+            if self.platform not in STREAM_DISABLED:
+                yield part
+        if self.platform in STREAM_DISABLED:
+            yield response
+
+        self.context.setdefault("conversations", []).extend([
+            {"role": "user", "content": query},
+            {"role": "assistant", "content": response},
+        ])
+
     async def shut_down(self):
         await log("Shutting Down all services...", "info")
+        if self.config_watcher is not None:
+            self.config_watcher.cancel()
+            # Let a running swap stop its half-started model before we stop the rest
+            await asyncio.gather(self.config_watcher, return_exceptions=True)
         shutdown_tasks = [model.shutdown() for model in self.models.values()]
         await asyncio.gather(*shutdown_tasks)
         await self.save_context()
@@ -102,8 +305,8 @@ async def main():
             break
         
         try:
-            # async for part in ai.generate(req):
-            #     print(part, end="", flush=True)
+            async for part in ai.generate(req):
+                print(part, end="", flush=True)
             print()
         except Exception as e:
             await log(f"Main loop error: {e}", "error")
@@ -1,5 +1,14 @@
 STREAM_DISABLED= ["discod", "cli-no-stream"]
 
+# Tool calling limits
+TOOL_TIMEOUT = 15 # seconds per tool call
+MAX_TOOL_ITERATIONS = 5 # model -> tools -> model round trips per query
+# Threads for blocking tools, kept apart from the default executor. More blocking calls than
+# this in one turn queue up (each may wait up to its timeout for a worker, then up to its timeout
+# to run), and timed out tools keep their thread until they actually return.
+TOOL_WORKERS = 4
+TOOL_CACHE_SIZE = 256 # memoized results of deterministic tools (LRU)
+
 # A base system prompt for the sake of my sanity, will to live AND to prevent me to lose context
 
 DEFAULT_PROMPT: str = r"""
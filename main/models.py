@@ -21,6 +21,8 @@ class Model:
         self.warmed_up = False
         self.session: aiohttp.ClientSession | None = None
         self.process = None
+        self.in_flight = 0 # requests currently being served, used to drain before shutdown
+        self.tools_supported = True # cleared when Ollama rejects tools for this model's template
 
     def _get_endpoint(self) -> str:
         return "/api/chat"
@@ -58,7 +60,10 @@ class Model:
             )
 
         await self.wait_until_ready(self.host)
-        
+        await self.check_generation()
+
+    async def check_generation(self):
+        """Loads the model on the server at self.host with one non-streaming and one streaming request."""
         if not self.session:
             self.session = aiohttp.ClientSession()
 
@@ -113,20 +118,22 @@ class Model:
         await log(f"🟩 [INFO] {self.name} ({self.ollama_name}) warmed up!", "success")
 
     async def generate_response_noStream(self, query: str, context: dict) -> str:
-        await log(f"Generating non-streaming response from {self.name}...", "info")
-        endpoint = self._get_endpoint()
-        url = f"{self.host}{endpoint}"
-        messages = context.get("conversations", []) + [{"role": "user", "content": query}]
-        headers = {"Content-Type": "application/json"}
-        data = {
-            "model": self.ollama_name,
-            "messages": messages,
-            "stream": False,
-        }
-        if not self.session:
-            self.session = aiohttp.ClientSession()
-
+        # Counted before the first await so a hot reload can't drain this model between lookup and request
+        self.in_flight += 1
         try:
+            await log(f"Generating non-streaming response from {self.name}...", "info")
+            endpoint = self._get_endpoint()
+            url = f"{self.host}{endpoint}"
+            messages = context.get("conversations", []) + [{"role": "user", "content": query}]
+            headers = {"Content-Type": "application/json"}
+            data = {
+                "model": self.ollama_name,
+                "messages": messages,
+                "stream": False,
+            }
+            if not self.session:
+                self.session = aiohttp.ClientSession()
+
             async with self.session.post(url, headers=headers, data=json.dumps(data)) as response:
                 response.raise_for_status()
                 res_json = await response.json()
@@ -144,6 +151,8 @@ class Model:
         except Exception as e:
             await log(f"🟥 [Error]: {e}", "error")
             return f"An unexpected error occurred: {e}"
+        finally:
+            self.in_flight -= 1
 
     async def generate_response_Stream(self, query: str, context: dict):
         await log(f"Generating streaming response from {self.name}...", "info")
@@ -159,6 +168,7 @@ class Model:
         if not self.session:
             self.session = aiohttp.ClientSession()
 
+        self.in_flight += 1
         try:
             async with self.session.post(url, headers=headers, data=json.dumps(data)) as response:
                 response.raise_for_status()
@@ -183,6 +193,86 @@ class Model:
         except Exception as e:
             await log(f"🟥 [ERROR] Unexpected: {e}", "error")
             yield f"\n[Unexpected error: {e}]"
+        finally:
+            self.in_flight -= 1
+
+    async def generate_tool_step(self, messages: list[dict], tools: list[dict] | None = None):
+        """Streams one assistant turn. Yields {"content": str} parts and, if the model asked for tools, a final {"tool_calls": [...]}."""
+        await log(f"Generating tool-aware response from {self.name}...", "info")
+        endpoint = self._get_endpoint()
+        url = f"{self.host}{endpoint}"
+        headers = {"Content-Type": "application/json"}
+        data = {
+            "model": self.ollama_name,
+            "messages": messages,
+            "stream": True,
+        }
+        if tools and self.has_tools and self.tools_supported:
+            data["tools"] = tools
+        if not self.session:
+            self.session = aiohttp.ClientSession()
+
+        tool_calls = []
+        retry_without_tools = False
+        self.in_flight += 1
+        try:
+            async with self.session.post(url, headers=headers, data=json.dumps(data)) as response:
+                response.raise_for_status()
+                buffer = ""
+                async for chunk in response.content.iter_any():
+                    buffer += chunk.decode("utf-8")
+                    while "\n" in buffer:
+                        line, buffer = buffer.split("\n", 1)
+                        if line.strip():
+                            try:
+                                json_line = json.loads(line.strip())
+                                message = json_line.get('message', {})
+                                # Ollama sends tool calls in their own chunk(s), usually with empty content
+                                tool_calls.extend(message.get('tool_calls') or [])
+                                if message.get('content'):
+                                    yield {"content": message['content']}
+                            except json.JSONDecodeError:
+                                continue
+        except aiohttp.ClientResponseError as e:
+            if e.status == 400 and "tools" in data:
+                # e.g. "... does not support tools": the config says has_tools but the template doesn't
+                await log(f"⚠️ {self.name} rejected tools ({e.message}). Retrying without them.", "warn")
+                self.tools_supported = False
+                retry_without_tools = True
+            else:
+                await log(f"🟥 [ERROR] Connection error: {e}", "error")
+                yield {"content": f"\n[Connection error: {e}]"}
+                return
+        except aiohttp.ClientError as e:
+            await log(f"🟥 [ERROR] Connection error: {e}", "error")
+            yield {"content": f"\n[Connection error: {e}]"}
+            return
+        except TimeoutError as e:
+            await log(f"🟥 Timeout Error: {e}", "error")
+            yield {"content": f"\n🟥 Timeout Error: {e}"}
+            return
+        except Exception as e:
+            await log(f"🟥 [ERROR] Unexpected: {e}", "error")
+            yield {"content": f"\n[Unexpected error: {e}]"}
+            return
+        finally:
+            self.in_flight -= 1
+
+        if retry_without_tools:
+            async for part in self.generate_tool_step(messages):
+                yield part
+            return
+
+        if tool_calls:
+            yield {"tool_calls": tool_calls}
+
+    async def drain(self, timeout: int = 60):
+        await log(f"Draining {self.name} ({self.in_flight} in flight)...", "info")
+        for _ in range(timeout * 10):
+            if self.in_flight == 0:
+                return
+            await asyncio.sleep(0.1)
+        await log(f"⚠️ {self.name} still had {self.in_flight} request(s) in flight after {timeout}s.", "warn")
 
     async def shutdown(self):
         await log(f"Shutting down {self.name}...", "info")
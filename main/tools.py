@@ -0,0 +1,164 @@
+import json
+import asyncio
+import inspect
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from utils import log
+from configs import TOOL_TIMEOUT, TOOL_WORKERS, TOOL_CACHE_SIZE
+
+class Tool:
+    def __init__(self, name: str, description: str, parameters: dict, func, deterministic: bool = False, timeout: float = TOOL_TIMEOUT):
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.func = func
+        self.deterministic = deterministic
+        self.timeout = timeout
+
+    def schema(self) -> dict:
+        # Ollama's /api/chat "tools" format
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+            },
+        }
+
+class ToolPoolSaturated(Exception):
+    pass
+
+class ToolRegistry:
+    def __init__(self, workers: int = TOOL_WORKERS, cache_size: int = TOOL_CACHE_SIZE):
+        self.tools: dict[str, Tool] = {}
+        self.cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self.cache_size = cache_size
+        # Identical deterministic calls that are still running share one task
+        self.pending: dict[tuple[str, str], asyncio.Future] = {}
+        # Own pool so hung tools can't starve asyncio.to_thread / the default executor.
+        # A timed out thread can't be killed though: it keeps its worker until the tool returns.
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool")
+
+    def register(self, tool: Tool):
+        self.tools[tool.name] = tool
+
+    def tool(self, name: str, description: str, parameters: dict | None = None, deterministic: bool = False, timeout: float = TOOL_TIMEOUT):
+        """Decorator version of register()."""
+        def decorator(func):
+            self.register(Tool(
+                name,
+                description,
+                parameters or {"type": "object", "properties": {}},
+                func,
+                deterministic,
+                timeout,
+            ))
+            return func
+        return decorator
+
+    def schemas(self) -> list[dict]:
+        return [tool.schema() for tool in self.tools.values()]
+
+    @staticmethod
+    def parse_call(call: dict) -> tuple[str, dict]:
+        # Malformed calls become an "unknown tool" / no-argument call rather than breaking the whole turn
+        function = (call.get("function") if isinstance(call, dict) else None) or {}
+        name = function.get("name") or ""
+        args = function.get("arguments") or {}
+        # Some models send the arguments as a JSON string instead of an object
+        if isinstance(args, str):
+            try:
+                args = json.loads(args)
+            except json.JSONDecodeError:
+                args = {}
+        if not isinstance(args, dict):
+            args = {}
+        return str(name), args
+
+    async def run(self, name: str, args: dict) -> str:
+        tool = self.tools.get(name)
+        if tool is None:
+            await log(f"⚠️ Model called unknown tool '{name}'.", "warn")
+            return f"Error: unknown tool '{name}'."
+
+        key = (name, json.dumps(args, sort_keys=True, default=str))
+        await log(f"Running tool '{name}' with {args}", "info")
+        try:
+            if not tool.deterministic:
+                return await self.execute(tool, args)
+
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                await log(f"Tool '{name}' served from cache.", "info")
+                return self.cache[key]
+
+            task = self.pending.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self.execute(tool, args))
+                self.pending[key] = task
+                task.add_done_callback(lambda t: self._store(key, t))
+            # shield: one caller being cancelled must not cancel the call for the others sharing it
+            return await asyncio.shield(task)
+        except ToolPoolSaturated:
+            await log(f"🟥 Tool pool saturated ({self.workers} workers busy); '{name}' never started.", "error")
+            return f"Error: tool '{name}' could not start, all tool workers are busy."
+        except asyncio.TimeoutError:
+            await log(f"🟥 Tool '{name}' timed out after {tool.timeout}s.", "error")
+            return f"Error: tool '{name}' timed out."
+        except Exception as e:
+            await log(f"🟥 Tool '{name}' failed: {e}", "error")
+            return f"Error: tool '{name}' failed: {e}"
+
+    async def execute(self, tool: Tool, args: dict) -> str:
+        if inspect.iscoroutinefunction(tool.func):
+            result = await asyncio.wait_for(tool.func(**args), tool.timeout)
+        else:
+            loop = asyncio.get_running_loop()
+            started = asyncio.Event()
+
+            def job():
+                loop.call_soon_threadsafe(started.set)
+                return tool.func(**args)
+
+            future = loop.run_in_executor(self.executor, job)
+            # The tool's timeout only starts once a worker picks it up, so queueing behind
+            # other calls isn't blamed on this tool. Waiting a whole timeout without a free
+            # worker means the pool is held by hung threads.
+            try:
+                await asyncio.wait_for(started.wait(), tool.timeout)
+            except asyncio.TimeoutError:
+                future.cancel()
+                raise ToolPoolSaturated()
+            result = await asyncio.wait_for(future, tool.timeout)
+        return result if isinstance(result, str) else json.dumps(result, default=str)
+
+    def _store(self, key: tuple[str, str], task: asyncio.Future):
+        self.pending.pop(key, None)
+        # Failures and timeouts aren't cached so the next call retries
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.cache[key] = task.result()
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def run_calls(self, calls: list[dict]) -> list[dict]:
+        """Runs every tool call of one model turn concurrently and returns the tool messages in call order."""
+        parsed = [self.parse_call(call) for call in calls]
+        results = await asyncio.gather(*(self.run(name, args) for name, args in parsed))
+        return [
+            {"role": "tool", "tool_name": name, "content": result}
+            for (name, _), result in zip(parsed, results)
+        ]
+
+default_tools = ToolRegistry()
+
+@default_tools.tool(
+    "get_current_time",
+    "Get the current local date and time.",
+)
+def get_current_time():
+    return datetime.now().strftime("%H:%M:%S %d/%m/%Y")